@@ -24,12 +24,28 @@ SOFTWARE.
 
 
 from abc import abstractmethod
-from collections import defaultdict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import json
-import itertools
 import logging
+import mmap
 import os
 import struct
+import sys
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from s2e_env.command import ProjectCommand, CommandError
 from s2e_env.symbols.paths import guess_target_path
@@ -39,47 +55,27 @@ from . import get_tb_files, aggregate_tb_files_per_state
 logger = logging.getLogger('basicblock')
 
 
-class BasicBlock:
+class _BasicBlock(NamedTuple):
+    start_addr: int
+    end_addr: int
+    function: str
+
+
+class BasicBlock(_BasicBlock):
     """
     Immutable basic block representation.
     """
 
-    def __init__(self, start_addr, end_addr, function=None):
-        self._start_addr = start_addr
-        self._end_addr = end_addr
-        self._function = function if function else ''
+    __slots__ = ()
 
-    @property
-    def start_addr(self):
-        return self._start_addr
-
-    @property
-    def end_addr(self):
-        return self._end_addr
-
-    @property
-    def function(self):
-        return self._function
+    def __new__(cls, start_addr, end_addr, function=None):
+        # Many basic blocks share the same function name, so intern the name
+        # so that a single copy is shared between them
+        return super().__new__(cls, start_addr, end_addr,
+                               sys.intern(function) if function else '')
 
     def __str__(self):
-        return f'BB(start=0x{self._start_addr:x}, end=0x{self._end_addr:x}, function={self._function})'
-
-
-class BasicBlockEncoder(json.JSONEncoder):
-    """
-    Encodes a ``BasicBlock`` object in JSON format.
-    """
-
-    # pylint: disable=method-hidden
-    def default(self, o):
-        if isinstance(o, BasicBlock):
-            return {
-                'start_addr': o.start_addr,
-                'end_addr': o.end_addr,
-                'function': o.function,
-            }
-
-        return super().default(o)
+        return f'BB(start=0x{self.start_addr:x}, end=0x{self.end_addr:x}, function={self.function})'
 
 
 class BasicBlockDecoder(json.JSONDecoder):
@@ -100,31 +96,348 @@ class BasicBlockDecoder(json.JSONDecoder):
         return d
 
 
-def _binary_search(tb_start_addr, bbs):
+def load_disassembly_info(path):
     """
-    Perform a binary search to find the index of a basic block that fits the
-    given translation block.
+    Load disassembly information from a JSON .disas file.
+
+    This is faster than decoding the file with ``BasicBlockDecoder``, as no
+    Python callback is invoked for every JSON object. orjson is used to parse
+    the file if it is available.
     """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    disas_info = orjson.loads(data) if orjson else json.loads(data)
+    disas_info['bbs'] = [BasicBlock(bb['start_addr'], bb['end_addr'], bb['function'])
+                         for bb in disas_info['bbs']]
+
+    return disas_info
+
+
+# The disassembly cache file is laid out as follows:
+#
+# 1. A header containing a magic value, the number of basic blocks, the
+# module's base and end addresses, and the number of functions
+# 2. The basic block start addresses (uint64)
+# 3. The basic block end addresses (uint64)
+# 4. The offset of each function name in the name table, followed by the end
+# offset of the table (uint64)
+# 5. The index of each basic block's function (uint32)
+# 6. The name table: the UTF-8 encoded function names, back-to-back
+DISAS_CACHE_MAGIC = b'S2E-DISAS-CACHE1'
+DISAS_CACHE_HEADER = struct.Struct('<16sQQQQ')
+
+
+class _MappedBasicBlocks(Sequence):
+    """
+    A read-only sequence of basic blocks backed by the (memory-mapped) arrays
+    of a disassembly cache file. ``BasicBlock`` objects are only created when
+    they are accessed.
+    """
+
+    __slots__ = 'starts', 'ends', '_func_idxs', '_functions'
+
+    def __init__(self, starts, ends, func_idxs, functions):
+        self.starts = starts
+        self.ends = ends
+        self._func_idxs = func_idxs
+        self._functions = functions
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        return BasicBlock(int(self.starts[idx]), int(self.ends[idx]),
+                          self._functions[self._func_idxs[idx]])
+
+
+def _save_disassembly_cache(path, disas_info):
+    """
+    Save the disassembly information to a disassembly cache file.
+    """
+    bbs = disas_info['bbs']
+    bb_starts, bb_ends = _get_basic_block_arrays(bbs)
+
+    func_idxs = {}
+    bb_func_idxs = np.fromiter((func_idxs.setdefault(bb.function, len(func_idxs)) for bb in bbs),
+                               dtype='<u4', count=len(bbs))
+
+    names = [func.encode('utf-8') for func in func_idxs]
+    name_offsets = np.zeros(len(names) + 1, dtype='<u8')
+    np.cumsum(np.fromiter((len(name) for name in names), dtype='<u8', count=len(names)),
+              out=name_offsets[1:])
+
+    # Another process may have the existing cache file memory-mapped, and
+    # truncating it would crash that process (with a SIGBUS). Instead, write
+    # the new cache file alongside it and atomically replace it
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(DISAS_CACHE_HEADER.pack(DISAS_CACHE_MAGIC, len(bbs),
+                                            disas_info['base_addr'],
+                                            disas_info['end_addr'], len(names)))
+            f.write(bb_starts.astype('<u8', copy=False).tobytes())
+            f.write(bb_ends.astype('<u8', copy=False).tobytes())
+            f.write(name_offsets.tobytes())
+            f.write(bb_func_idxs.tobytes())
+            f.write(b''.join(names))
+
+        os.replace(tmp_path, path)
+
+        # Replacing the file updates the directory's modification time, which
+        # would make the cache file appear out of date (see
+        # ``BasicBlockCoverage._get_cached_disassembly_info``)
+        os.utime(path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _parse_disassembly_cache(buf):
+    """
+    Parse the contents of a disassembly cache file.
+
+    The basic block arrays are views of ``buf``, so no copying is required.
+
+    Returns:
+        A tuple containing the basic blocks (as a ``_MappedBasicBlocks``), the
+        module's base address and the module's end address.
+
+    Raises:
+        ValueError: If ``buf`` is not a valid disassembly cache file.
+        struct.error: If ``buf`` is too small to contain the header.
+    """
+    magic, num_bbs, base_addr, end_addr, num_funcs = DISAS_CACHE_HEADER.unpack_from(buf)
+    if magic != DISAS_CACHE_MAGIC:
+        raise ValueError('Invalid disassembly cache magic value')
+
+    # Check the counts before using them, because huge (corrupt) counts cause
+    # numpy to raise an OverflowError rather than a ValueError
+    if DISAS_CACHE_HEADER.size + num_bbs * (8 + 8 + 4) + (num_funcs + 1) * 8 > len(buf):
+        raise ValueError('Invalid disassembly cache basic block or function count')
+
+    offset = DISAS_CACHE_HEADER.size
+    bb_starts = np.frombuffer(buf, dtype='<u8', count=num_bbs, offset=offset)
+    offset += bb_starts.nbytes
+    bb_ends = np.frombuffer(buf, dtype='<u8', count=num_bbs, offset=offset)
+    offset += bb_ends.nbytes
+    name_offsets = np.frombuffer(buf, dtype='<u8', count=num_funcs + 1, offset=offset)
+    offset += name_offsets.nbytes
+    bb_func_idxs = np.frombuffer(buf, dtype='<u4', count=num_bbs, offset=offset)
+    offset += bb_func_idxs.nbytes
+
+    name_table = buf[offset:]
+    if name_offsets[0] != 0 or name_offsets[-1] != len(name_table) or \
+            np.any(name_offsets[1:] < name_offsets[:-1]):
+        raise ValueError('Invalid disassembly cache function name table')
+
+    if num_bbs and bb_func_idxs.max() >= num_funcs:
+        raise ValueError('Invalid disassembly cache function index')
+
+    name_offsets = name_offsets.tolist()
+    functions = [name_table[start:end].decode('utf-8')
+                 for start, end in zip(name_offsets, name_offsets[1:])]
+
+    return _MappedBasicBlocks(bb_starts, bb_ends, bb_func_idxs, functions), base_addr, end_addr
+
+
+def _load_disassembly_cache(path):
+    """
+    Load the disassembly information from a disassembly cache file.
+
+    The file is memory-mapped and the basic block arrays are used in-place, so
+    no parsing or copying is required.
+
+    Returns:
+        A ``dict`` containing the disassembly information, or ``None`` if the
+        file is not a valid disassembly cache file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        bbs, base_addr, end_addr = _parse_disassembly_cache(mm)
+    except (struct.error, ValueError):
+        # Note that UnicodeDecodeError is a subclass of ValueError
+        return None
+
+    return {
+        'bbs': bbs,
+        'base_addr': base_addr,
+        'end_addr': end_addr,
+    }
+
+
+def _get_basic_block_arrays(bbs):
+    """
+    Split the (sorted) basic block list into parallel arrays of start and end
+    addresses, so that the coverage calculation can be vectorized.
+    """
+    if isinstance(bbs, _MappedBasicBlocks):
+        return bbs.starts, bbs.ends
+
     num_bbs = len(bbs)
-    lo = 0
-    hi = num_bbs - 1
+    bb_starts = np.fromiter((bb.start_addr for bb in bbs), dtype=np.uint64, count=num_bbs)
+    bb_ends = np.fromiter((bb.end_addr for bb in bbs), dtype=np.uint64, count=num_bbs)
 
-    if tb_start_addr <= bbs[0].end_addr:
-        return 0
-    if tb_start_addr > bbs[hi].end_addr:
-        return num_bbs
+    return bb_starts, bb_ends
 
-    while lo <= hi:
-        mid = (lo + hi) // 2
 
-        if bbs[mid].start_addr < tb_start_addr:
-            lo = mid + 1
-        elif bbs[mid].start_addr > tb_start_addr:
-            hi = mid - 1
-        else:
-            return mid
+def _jit(func):
+    """
+    JIT-compile the given function with Numba (if it is available).
+    """
+    if njit is None:
+        return func
+
+    return njit(cache=True, boundscheck=False)(func)
+
+
+@_jit
+def _cover_kernel(tb_starts, tb_los, tb_his, bb_ends, covered):
+    """
+    Mark each basic block that overlaps at least one translation block in the
+    ``covered`` mask.
+
+    Only the basic blocks in ``[tb_los[j], tb_his[j])`` can overlap the ``j``th
+    translation block: every basic block before ``tb_los[j]`` ends at or
+    before the translation block's start address, and every basic block from
+    ``tb_his[j]`` onwards starts after the translation block's end address.
+    """
+    for j in range(tb_starts.shape[0]):
+        tb_start_addr = tb_starts[j]
+
+        # Basic block end addresses are exclusive, so a basic block that ends
+        # where the translation block starts does not overlap it
+        for i in range(tb_los[j], tb_his[j]):
+            if bb_ends[i] > tb_start_addr:
+                covered[i] = True
+
+
+def _get_tb_arrays(coverage):
+    """
+    Split the translation block coverage of a single state into parallel
+    arrays of start and end addresses.
+
+    The same translation block may be recorded many times (e.g., with
+    different sizes, or across multiple coverage files), so duplicates are
+    removed. This also sorts the translation blocks by start address.
+    """
+    tbs = np.array([(start, end) for start, end, _ in coverage], dtype=np.uint64)
+    tbs = np.unique(tbs.reshape(-1, 2), axis=0)
+
+    return np.ascontiguousarray(tbs[:, 0]), np.ascontiguousarray(tbs[:, 1])
+
+
+# Starting a pool of worker processes takes a few hundred milliseconds, so only
+# calculate the coverage in parallel when the kernel has to check at least this
+# many basic blocks (across all states). The kernel is much slower when it is
+# not JIT-compiled, so the pool pays for itself sooner
+PARALLEL_COVERAGE_MIN_WORK = 1 << 28 if njit else 1 << 22
+
+
+def _get_tb_bounds(bb_arrays, tb_starts, tb_ends):
+    """
+    Bound the basic blocks that each translation block can overlap (see
+    ``_cover_kernel``), so that the kernel only has to check the basic blocks
+    that lie between these bounds.
+
+    Args:
+        bb_arrays: A ``(3, num_bbs)`` array holding the basic block start
+        addresses, end addresses and the running maximum of the end addresses.
+        tb_starts: The state's translation block start addresses.
+        tb_ends: The state's translation block end addresses.
+
+    Returns:
+        A tuple containing the lower and upper bounds for each translation
+        block.
+    """
+    bb_starts, _, bb_max_ends = bb_arrays
+
+    tb_los = np.searchsorted(bb_max_ends, tb_starts, side='right')
+    tb_his = np.searchsorted(bb_starts, tb_ends, side='right')
+
+    return tb_los, tb_his
+
+
+def _cover_state(bb_arrays, tb_starts, tb_los, tb_his):
+    """
+    Calculate the basic block coverage for a single state.
+
+    Args:
+        bb_arrays: A ``(3, num_bbs)`` array holding the basic block start
+        addresses, end addresses and the running maximum of the end addresses.
+        tb_starts: The state's translation block start addresses.
+        tb_los: The lower basic block bound for each translation block.
+        tb_his: The upper basic block bound for each translation block.
+
+    Returns:
+        The packed bitmap of covered basic blocks, or ``None`` if no basic
+        blocks were covered.
+    """
+    covered = np.zeros(bb_arrays.shape[1], dtype=np.bool_)
+    _cover_kernel(tb_starts, tb_los, tb_his, bb_arrays[1], covered)
+
+    if not covered.any():
+        return None
+
+    return np.packbits(covered, bitorder='little')
+
+
+def _cover_state_shared(shm_name, num_bbs, tb_starts, tb_los, tb_his):
+    """
+    Calculate the basic block coverage for a single state in a worker
+    process. The basic block arrays are read from the given shared memory
+    block (see ``_cover_state``).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bb_arrays = np.ndarray((3, num_bbs), dtype=np.uint64, buffer=shm.buf)
+
+    try:
+        return _cover_state(bb_arrays, tb_starts, tb_los, tb_his)
+    finally:
+        # The shared memory cannot be closed while it is still referenced
+        del bb_arrays
+        shm.close()
+
+
+def _cover_states_parallel(bb_arrays, tbs):
+    """
+    Calculate the basic block coverage for each state in a pool of worker
+    processes. The basic block arrays are shared with the workers through
+    shared memory.
+
+    Returns:
+        A ``dict`` mapping state IDs to the result of ``_cover_state``, or
+        ``None`` if shared memory is not available (e.g., there is no
+        ``/dev/shm`` in a container).
+    """
+    try:
+        shm = shared_memory.SharedMemory(create=True, size=bb_arrays.nbytes)
+    except OSError as e:
+        logger.warning('Unable to create shared memory, calculating basic block '
+                       'coverage serially: %s', e)
+        return None
+
+    try:
+        shared_bb_arrays = np.ndarray(bb_arrays.shape, dtype=bb_arrays.dtype, buffer=shm.buf)
+        shared_bb_arrays[:] = bb_arrays
+        del shared_bb_arrays
+
+        max_workers = min(len(tbs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {state: executor.submit(_cover_state_shared, shm.name,
+                                              bb_arrays.shape[1], *tb_arrays)
+                       for state, tb_arrays in tbs.items()}
+            return {state: future.result() for state, future in futures.items()}
+    finally:
+        shm.close()
+        shm.unlink()
 
-    return num_bbs
 
 def _get_basic_block_coverage(tb_coverage, bbs):
     """
@@ -134,32 +447,77 @@ def _get_basic_block_coverage(tb_coverage, bbs):
     by the chosen disassembler) and the translation block (TB) list
     (extracted from the JSON file(s) generated by S2E's
     ``TranslationBlockCoverage`` plugin).
+
+    A basic block ``[start_addr, end_addr)`` (i.e., the end address is
+    exclusive, as returned by the disassemblers) is covered if it overlaps any
+    translation block ``[tb_start_addr, tb_end_addr]`` (where the end address
+    is the address of the translation block's last instruction). This includes
+    basic blocks that lie entirely within a translation block, and translation
+    blocks that do not start at a basic block's start address.
+
+    Each state's coverage is independent of the other states, so when there is
+    more than one state (and enough work to pay for starting the workers) the
+    coverage is calculated in parallel by a pool of worker processes.
+
+    Returns:
+        A ``dict`` mapping state IDs to a bitmap of the basic blocks (indexed
+        by their position in ``bbs``) covered by that state. The bitmap is
+        packed into a ``numpy.uint8`` array, with eight basic blocks per byte.
     """
-    covered_bbs = defaultdict(set)
-    num_bbs = len(bbs)
+    covered_bbs = {}
 
+    # Store the basic block start addresses, end addresses and the running
+    # maximum of the end addresses in a single array.
+    #
+    # The basic blocks are sorted by start address, but this does not
+    # guarantee that their end addresses are sorted (e.g., if the disassembler
+    # returns overlapping basic blocks). The running maximum of the end
+    # addresses is always sorted, so we can search on that instead
+    bb_arrays = np.empty((3, len(bbs)), dtype=np.uint64)
+    bb_arrays[0], bb_arrays[1] = _get_basic_block_arrays(bbs)
+    np.maximum.accumulate(bb_arrays[1], out=bb_arrays[2])
+
+    tbs = {}
     for state, coverage in tb_coverage.items():
-        logger.info('Calculating basic block coverage for state %d', state)
+        tb_starts, tb_ends = _get_tb_arrays(coverage)
+        tbs[state] = (tb_starts, *_get_tb_bounds(bb_arrays, tb_starts, tb_ends))
 
-        for tb_start_addr, tb_end_addr, _ in coverage:
-            start_idx = _binary_search(tb_start_addr, bbs)
-            for i in range(start_idx, num_bbs):
-                bb = bbs[i]
+    # The number of basic blocks that the kernel has to check
+    work = sum(int((tb_his - tb_los).sum()) for _, tb_los, tb_his in tbs.values())
 
-                # Check if the translation block falls within the basic block
-                # OR the basic block falls within the translation block
-                if (bb.end_addr >= tb_start_addr >= bb.start_addr or
-                        bb.start_addr <= tb_end_addr <= bb.end_addr):
-                    covered_bbs[state].add(bb)
+    results = None
+    if len(tbs) > 1 and work >= PARALLEL_COVERAGE_MIN_WORK:
+        results = _cover_states_parallel(bb_arrays, tbs)
+    if results is None:
+        results = {state: _cover_state(bb_arrays, *tb_arrays) for state, tb_arrays in tbs.items()}
 
-                # Short circuit if the basic block has gone outside of the
-                # current translation block
-                if bb.start_addr > tb_end_addr:
-                    break
+    for state, bitmap in results.items():
+        logger.info('Calculated basic block coverage for state %d', state)
+
+        if bitmap is not None:
+            covered_bbs[state] = bitmap
 
     return covered_bbs
 
 
+def _get_covered_basic_block_idxs(bitmap, num_bbs):
+    """
+    Get the indices of the basic blocks set in the given coverage bitmap.
+    """
+    return np.flatnonzero(np.unpackbits(bitmap, count=num_bbs, bitorder='little'))
+
+
+def _get_num_covered_basic_blocks(bb_coverage, num_bbs):
+    """
+    Count the number of unique basic blocks covered across all states.
+    """
+    if not bb_coverage:
+        return 0
+
+    bitmap = np.bitwise_or.reduce(np.stack(list(bb_coverage.values())), axis=0)
+    return int(np.unpackbits(bitmap, count=num_bbs, bitorder='little').sum())
+
+
 class BasicBlockCoverage(ProjectCommand):
     """
     Generate a basic block coverage report.
@@ -223,7 +581,7 @@ class BasicBlockCoverage(ProjectCommand):
 
         # Calculate some statistics (across all states)
         total_bbs = len(bbs)
-        num_covered_bbs = len(set(itertools.chain(*iter(bb_coverage.values()))))
+        num_covered_bbs = _get_num_covered_basic_blocks(bb_coverage, total_bbs)
 
         # Write the basic block coverage information to disk.
         #
@@ -236,9 +594,11 @@ class BasicBlockCoverage(ProjectCommand):
             bb_coverage_loc = self._save_drcov(module_path,
                                                disas_info['base_addr'],
                                                disas_info['end_addr'],
+                                               bbs,
                                                bb_coverage)
         else:
             bb_coverage_loc = self._save_basic_block_coverage(module_name,
+                                                              bbs,
                                                               bb_coverage,
                                                               total_bbs,
                                                               num_covered_bbs)
@@ -255,6 +615,10 @@ class BasicBlockCoverage(ProjectCommand):
         tb_files = get_tb_files(self.project_path('s2e-last'))
         tb_coverage_files = aggregate_tb_files_per_state(tb_files)
 
+        # Several guest module paths may resolve to the same binary. Merge
+        # their translation block coverage, so that each binary is only
+        # disassembled (and its basic block coverage only saved) once
+        module_tb_coverage = {}
         for module_path, tb_coverage in tb_coverage_files.items():
             try:
                 actual_module_path = guess_target_path(self.symbol_search_path, module_path)
@@ -262,7 +626,12 @@ class BasicBlockCoverage(ProjectCommand):
                 logger.error(e)
                 continue
 
-            self._save_coverage(actual_module_path, tb_coverage, options['drcov'])
+            states = module_tb_coverage.setdefault(actual_module_path, {})
+            for state, coverage in tb_coverage.items():
+                states.setdefault(state, set()).update(coverage)
+
+        for module_path, tb_coverage in module_tb_coverage.items():
+            self._save_coverage(module_path, tb_coverage, options['drcov'])
 
     def _initialize_disassembler(self):
         """
@@ -285,9 +654,13 @@ class BasicBlockCoverage(ProjectCommand):
     def _get_cached_disassembly_info(self, module):
         """
         Check if the disassembly information from the target binary has already
-        been generated (in a .disas file). If it has, reuse this information.
+        been generated (in a .disas.bin file). If it has, reuse this
+        information.
 
-        The .disas file is just a JSON dump.
+        The .disas.bin file stores the basic blocks as parallel arrays of start
+        addresses, end addresses and function names, and is memory-mapped when
+        loaded. Legacy .disas files (which are just a JSON dump) are also
+        supported, and are converted to .disas.bin files when they are loaded.
 
         Returns:
             A ``dict`` containing the disassembly information. If no .disas
@@ -295,8 +668,11 @@ class BasicBlockCoverage(ProjectCommand):
         """
         logger.info('Checking for existing .disas file')
 
-        disas_path = self.project_path(f'{module}.disas')
-        if not os.path.isfile(disas_path):
+        for disas_path in (self.project_path(f'{module}.disas.bin'),
+                           self.project_path(f'{module}.disas')):
+            if os.path.isfile(disas_path):
+                break
+        else:
             logger.info('No .disas file found')
             return None
 
@@ -313,29 +689,38 @@ class BasicBlockCoverage(ProjectCommand):
 
         logger.info('%s found. Returning cached basic blocks', disas_path)
 
-        with open(disas_path, 'r', encoding='utf-8') as disas_file:
-            return json.load(disas_file, cls=BasicBlockDecoder)
+        if not disas_path.endswith('.bin'):
+            # Convert the legacy .disas file so that it can be memory-mapped
+            # next time
+            disas_info = load_disassembly_info(disas_path)
+            self._save_disassembly_info(module, disas_info)
+
+            return disas_info
+
+        disas_info = _load_disassembly_cache(disas_path)
+        if not disas_info:
+            logger.warning('%s is invalid. A new .disas file will be generated',
+                           disas_path)
+
+        return disas_info
 
     def _save_disassembly_info(self, module, disas_info):
         """
-        Save the disassembly information to a .disas file in the project
+        Save the disassembly information to a .disas.bin file in the project
         directory.
 
-        The .disas file is just a JSON dump.
-
         Args:
             module: Name of the module for the disassembly information in
             ``disas_info``.
             disas_info: A dictionary containing the disassemly information.
         """
-        disas_path = self.project_path(f'{module}.disas')
+        disas_path = self.project_path(f'{module}.disas.bin')
 
         logger.info('Saving disassembly information to %s', disas_path)
 
-        with open(disas_path, 'w', encoding='utf-8') as disas_file:
-            json.dump(disas_info, disas_file, cls=BasicBlockEncoder)
+        _save_disassembly_cache(disas_path, disas_info)
 
-    def _save_basic_block_coverage(self, module, basic_blocks, total_bbs, num_covered_bbs):
+    def _save_basic_block_coverage(self, module, bbs, basic_blocks, total_bbs, num_covered_bbs):
         """
         Write the basic block coverage information to a single JSON file. This
         JSON file will contain the aggregate basic block coverage information
@@ -344,7 +729,9 @@ class BasicBlockCoverage(ProjectCommand):
         Args:
             module: Name of the module that basic block coverage has been
             generated for.
-            basic_blocks: Dictionary mapping state IDs to covered basic blocks.
+            bbs: The sorted list of basic blocks in the module.
+            basic_blocks: Dictionary mapping state IDs to covered basic block
+            bitmaps.
             total_bbs: The total number of basic blocks in the program.
             num_covered_bbs: The number of basic blocks covered by S2E.
 
@@ -355,19 +742,28 @@ class BasicBlockCoverage(ProjectCommand):
 
         logger.info('Saving basic block coverage to %s', bb_coverage_file)
 
-        to_dict = lambda bb: {'start_addr': bb.start_addr,
-                              'end_addr': bb.end_addr,
-                              'function': bb.function}
-        bbs_json = {
-            'stats': {
-                'total_basic_blocks': total_bbs,
-                'covered_basic_blocks': num_covered_bbs,
-            },
-            'coverage': [to_dict(bb) for bbs in basic_blocks.values() for bb in bbs],
+        dumps = orjson.dumps if orjson else lambda obj: json.dumps(obj).encode('utf-8')
+        stats = {
+            'total_basic_blocks': total_bbs,
+            'covered_basic_blocks': num_covered_bbs,
         }
 
-        with open(bb_coverage_file, 'w', encoding='utf-8') as f:
-            json.dump(bbs_json, f)
+        # Stream the covered basic blocks to the file one at a time, rather
+        # than building the complete JSON object in memory
+        with open(bb_coverage_file, 'wb') as f:
+            f.write(b'{"stats": ' + dumps(stats) + b', "coverage": [')
+
+            sep = b''
+            for bitmap in basic_blocks.values():
+                for i in _get_covered_basic_block_idxs(bitmap, len(bbs)).tolist():
+                    bb = bbs[i]
+                    f.write(sep)
+                    f.write(dumps({'start_addr': bb.start_addr,
+                                   'end_addr': bb.end_addr,
+                                   'function': bb.function}))
+                    sep = b', '
+
+            f.write(b']}')
 
         return bb_coverage_file
 
@@ -399,9 +795,65 @@ class BasicBlockCoverage(ProjectCommand):
     #     ushort size;
     #     ushort mod_id;
     # } bb_entry_t;
-    DRCOV_BB_FORMAT = 'IHH'
+    DRCOV_BB_DTYPE = np.dtype([('start', '<u4'), ('size', '<u2'), ('mod_id', '<u2')])
 
-    def _save_drcov(self, module_path, module_base, module_end, basic_blocks):
+    def _make_drcov(self, drcov_mod, bb_starts, bb_ends, covered_idxs, module_base):
+        """
+        Build the contents of a drcov file for the given covered basic blocks.
+
+        Args:
+            drcov_mod: The drcov module table entry.
+            bb_starts: The start addresses of all basic blocks in the module.
+            bb_ends: The end addresses of all basic blocks in the module.
+            covered_idxs: The indices of the covered basic blocks.
+            module_base: The module's base address.
+
+        Returns:
+            A ``bytearray`` containing the drcov file.
+
+        Raises:
+            CommandError: If a covered basic block cannot be represented in the
+            drcov format.
+        """
+        covered_starts = bb_starts[covered_idxs]
+        covered_sizes = bb_ends[covered_idxs] - covered_starts
+
+        # drcov stores 32-bit module offsets and 16-bit sizes. Check that the
+        # basic blocks fit, rather than letting numpy silently truncate them
+        if len(covered_idxs):
+            if covered_starts.min() < module_base or \
+                    covered_starts.max() - np.uint64(module_base) > 0xffffffff:
+                raise CommandError('Basic block start address is not within 4 GiB of the '
+                                   f'module base address {module_base:#x}, cannot write drcov file')
+            if covered_sizes.max() > 0xffff:
+                raise CommandError('Basic block size exceeds 65535 bytes, cannot write drcov file')
+
+        header = (self.DRCOV_HEADER + drcov_mod +
+                  f'BB Table: {len(covered_idxs)} bbs\n').encode('utf-8')
+
+        # The whole drcov file is built in a single buffer, starting with the
+        # header, and written out in one go. The basic block table is filled
+        # in-place through a numpy view of the buffer.
+        #
+        # Each drcov basic block entry is formatted as follows:
+        #
+        # 1. basic block start address (relative to the module base address)
+        # 2. basic block size
+        # 3. module ID that the basic block belongs to
+        #
+        # Because there is only a single module entry, the module ID will
+        # always be 0
+        drcov = bytearray(len(header) + self.DRCOV_BB_DTYPE.itemsize * len(covered_idxs))
+        drcov[:len(header)] = header
+
+        bb_table = np.frombuffer(drcov, dtype=self.DRCOV_BB_DTYPE, offset=len(header))
+        bb_table['start'] = covered_starts - np.uint64(module_base)
+        bb_table['size'] = covered_sizes
+        bb_table['mod_id'] = 0
+
+        return drcov
+
+    def _save_drcov(self, module_path, module_base, module_end, bbs, basic_blocks):
         """
         Write the basic block coverage information to multiple drcov files.
         Each drcov file corresponds to an individual S2E state.
@@ -416,7 +868,11 @@ class BasicBlockCoverage(ProjectCommand):
         Args:
             module_path: Path to the module that basic block coverage has been
             generated for.
-            basic_blocks: Dictionary mapping state IDs to covered basic blocks.
+            module_base: The module's base address.
+            module_end: The module's end address.
+            bbs: The sorted list of basic blocks in the module.
+            basic_blocks: Dictionary mapping state IDs to covered basic block
+            bitmaps.
 
         Returns:
             The path to the directory storing the drcov files.
@@ -427,44 +883,29 @@ class BasicBlockCoverage(ProjectCommand):
 
         os.mkdir(drcov_dir)
 
-        module = os.path.basename(module_path)
+        # Each drcov module entry is formatted as follows:
+        #
+        # 1. module ID
+        # 2. base address
+        # 3. end address
+        # 4. path to module on disk
+        #
+        # Because we only produce drcov information for the given module,
+        # there is only a single module with an ID of 0
+        drcov_mod = self.DRCOV_MOD_FORMAT.format(zero=0,
+                                                 base=module_base,
+                                                 end=module_end,
+                                                 path=module_path)
+
+        bb_starts, bb_ends = _get_basic_block_arrays(bbs)
 
-        for state, bbs in basic_blocks.items():
-            drcov_filename = f'{module}_coverage_{state}.drcov'
+        for state, bitmap in basic_blocks.items():
+            drcov_filename = f'{os.path.basename(module_path)}_coverage_{state}.drcov'
             drcov_file = os.path.join(drcov_dir, drcov_filename)
 
-            with open(drcov_file, 'wb', encoding='utf-8') as f:
-                f.write(self.DRCOV_HEADER)
-
-                # Each drcov module entry is formatted as follows:
-                #
-                # 1. module ID
-                # 2. base address
-                # 3. end address
-                # 4. path to module on disk
-                #
-                # Because we only produce drcov information for the given
-                # module, there is only a single module with an ID of 0
-                f.write(self.DRCOV_MOD_FORMAT.format(zero=0,
-                                                     base=module_base,
-                                                     end=module_end,
-                                                     path=module_path))
-
-                # Each drcov basic block entry is formatted as follows:
-                #
-                # 1. basic block start address (relative to the module base
-                # address)
-                # 2. basic block size
-                # 3. module ID that the basic block belongs to
-                #
-                # Because there is only a single module entry, the module ID
-                # will always be 0
-                f.write(f'BB Table: {len(bbs)} bbs\n')
-                for bb in bbs:
-                    s = str(struct.pack(self.DRCOV_BB_FORMAT,
-                                        bb.start_addr - module_base,
-                                        bb.end_addr - bb.start_addr,
-                                        0))
-                    f.write(s)
+            with open(drcov_file, 'wb', buffering=0) as f:
+                f.write(self._make_drcov(drcov_mod, bb_starts, bb_ends,
+                                         _get_covered_basic_block_idxs(bitmap, len(bbs)),
+                                         module_base))
 
         return drcov_dir
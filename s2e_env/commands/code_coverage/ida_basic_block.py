@@ -21,7 +21,6 @@ SOFTWARE.
 """
 
 
-import json
 import logging
 import os
 import shutil
@@ -35,7 +34,7 @@ except ImportError:
     from s2e_env.utils.tempdir import TemporaryDirectory
 
 from s2e_env.command import CommandError
-from .basic_block import BasicBlockCoverage, BasicBlockDecoder
+from .basic_block import BasicBlockCoverage, load_disassembly_info
 
 
 logger = logging.getLogger('basicblock')
@@ -148,7 +147,6 @@ class IDABasicBlockCoverage(BasicBlockCoverage):
 
                 logger.info('Disassembly successful')
                 # Parse the basic block list file
-                with open(disas_file, 'r', encoding='utf-8') as f:
-                    return json.load(f, cls=BasicBlockDecoder)
+                return load_disassembly_info(disas_file)
         except ErrorReturnCode as e:
             raise CommandError(e) from e
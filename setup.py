@@ -68,6 +68,7 @@ setup(
         'psutil',
         'protobuf3-to-dict',
         'immutables',
+        'numpy',
 
         # Dependencies for symchk
         'pdbparse==1.5',
@@ -82,6 +83,12 @@ setup(
         # Used by plugin creation script
         'pygit2==1.2.1'
     ],
+    extras_require={
+        # JIT-compiles the basic block coverage calculation
+        'jit': ['numba'],
+        # Faster JSON encoding/decoding of basic block information
+        'json': ['orjson'],
+    },
     tests_require=[
         'mock',
     ],
@@ -0,0 +1,362 @@
+"""
+Copyright (c) 2017 Dependable Systems Laboratory, EPFL
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import pickle
+import struct
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import call, patch
+
+import numpy as np
+
+from s2e_env.command import CommandError
+
+from s2e_env.commands.code_coverage import basic_block
+from s2e_env.commands.code_coverage.basic_block import BasicBlock
+
+
+class _TestBasicBlockCoverage(basic_block.BasicBlockCoverage):
+    """
+    Basic block coverage command that writes to the given project directory.
+    """
+
+    def __init__(self, project_dir):
+        super().__init__()
+
+        self._project_dir = project_dir
+        self._project_desc = {'project_dir': project_dir}
+
+    def _get_disassembly_info(self, module_path):
+        return None
+
+
+class BasicBlockCoverageTestCase(TestCase):
+    def setUp(self):
+        self._temp_dir = TemporaryDirectory()
+        self._project_dir = self._temp_dir.name
+        os.mkdir(os.path.join(self._project_dir, 's2e-last'))
+
+        self._cmd = _TestBasicBlockCoverage(self._project_dir)
+
+        self._bbs = [
+            BasicBlock(0x401000, 0x401008, 'main'),
+            BasicBlock(0x401010, 0x401020, 'main'),
+            BasicBlock(0x401030, 0x401040, 'foo'),
+        ]
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_handle_merges_module_coverage(self):
+        """Test that guest modules that resolve to the same binary are processed once"""
+        tb_coverage_files = {
+            '/bin/test': {0: {(0x401000, 0x401004, 5)}},
+            './test': {0: {(0x401032, 0x401034, 3)}, 1: {(0x401010, 0x401018, 2)}},
+            '/bin/other': {1: {(0x402000, 0x402004, 5)}},
+        }
+
+        with patch.object(basic_block, 'get_tb_files'), \
+                patch.object(basic_block, 'aggregate_tb_files_per_state', return_value=tb_coverage_files), \
+                patch.object(basic_block, 'guess_target_path', side_effect=lambda _, path: path.replace('.', '/bin')), \
+                patch.object(self._cmd, '_save_coverage') as save_coverage:
+            self._cmd.handle(drcov=False)
+
+        self.assertEqual(save_coverage.call_args_list, [
+            call('/bin/test', {
+                0: {(0x401000, 0x401004, 5), (0x401032, 0x401034, 3)},
+                1: {(0x401010, 0x401018, 2)},
+            }, False),
+            call('/bin/other', {1: {(0x402000, 0x402004, 5)}}, False),
+        ])
+
+    def test_save_drcov(self):
+        """Test that drcov basic block entries are written as packed structs"""
+        tb_coverage = {0: {(0x401000, 0x401004, 5), (0x401032, 0x401034, 3)}}
+        bb_coverage = basic_block._get_basic_block_coverage(tb_coverage, self._bbs)
+
+        drcov_dir = self._cmd._save_drcov('/bin/test', 0x400000, 0x500000,
+                                          self._bbs, bb_coverage)
+
+        with open(os.path.join(drcov_dir, 'test_coverage_0.drcov'), 'rb') as f:
+            drcov = f.read()
+
+        header, bb_table = drcov.split(b'BB Table: 2 bbs\n')
+        self.assertTrue(header.startswith(b'DRCOV VERSION: 2\n'))
+        self.assertEqual(len(bb_table), 2 * struct.calcsize('IHH'))
+
+        entries = [struct.unpack('IHH', bb_table[i:i + 8]) for i in range(0, len(bb_table), 8)]
+        self.assertEqual(entries, [(0x1000, 0x8, 0), (0x1030, 0x10, 0)])
+
+    def _make_drcov(self, bb, module_base):
+        bb_starts, bb_ends = basic_block._get_basic_block_arrays([bb])
+
+        return self._cmd._make_drcov('', bb_starts, bb_ends, np.array([0]), module_base)
+
+    def test_make_drcov_out_of_range(self):
+        """Test that basic blocks that do not fit in a drcov entry are rejected"""
+        invalid_bbs = [
+            # Below the module base address
+            (BasicBlock(0x3ff000, 0x3ff008, 'main'), 0x400000, 'not within 4 GiB'),
+            # More than 4 GiB above the module base address
+            (BasicBlock(0x100400000, 0x100400008, 'main'), 0x400000, 'not within 4 GiB'),
+            # Larger than 65535 bytes
+            (BasicBlock(0x401000, 0x411000, 'main'), 0x400000, 'exceeds 65535 bytes'),
+        ]
+
+        for bb, module_base, msg in invalid_bbs:
+            with self.subTest(bb=bb), self.assertRaisesRegex(CommandError, msg):
+                self._make_drcov(bb, module_base)
+
+    def test_make_drcov_max_range(self):
+        """Test the largest basic block offset and size that fit in a drcov entry"""
+        bb = BasicBlock(0xffffffffffff0000, 0xffffffffffffffff, 'main')
+
+        drcov = self._make_drcov(bb, 0xffffffff00000000)
+
+        self.assertEqual(struct.unpack('IHH', drcov[-8:]), (0xffff0000, 0xffff, 0))
+
+    def test_save_basic_block_coverage(self):
+        """Test that the streamed basic block coverage file is valid JSON"""
+        tb_coverage = {
+            0: {(0x401032, 0x401034, 3), (0x401000, 0x401004, 5)},
+            1: {(0x401010, 0x401018, 2), (0x401000, 0x401008, 1)},
+        }
+        bb_coverage = basic_block._get_basic_block_coverage(tb_coverage, self._bbs)
+        num_covered_bbs = basic_block._get_num_covered_basic_blocks(bb_coverage, len(self._bbs))
+
+        bb_coverage_file = self._cmd._save_basic_block_coverage('test', self._bbs, bb_coverage,
+                                                                len(self._bbs), num_covered_bbs)
+
+        with open(bb_coverage_file, 'r', encoding='utf-8') as f:
+            coverage = json.load(f)
+
+        self.assertEqual(coverage['stats'], {
+            'total_basic_blocks': 3,
+            'covered_basic_blocks': 3,
+        })
+
+        # Basic blocks are listed per state (in state order), sorted by start
+        # address within each state. Basic blocks covered by multiple states
+        # appear once for each state
+        self.assertEqual(coverage['coverage'], [
+            {'start_addr': 0x401000, 'end_addr': 0x401008, 'function': 'main'},
+            {'start_addr': 0x401030, 'end_addr': 0x401040, 'function': 'foo'},
+            {'start_addr': 0x401000, 'end_addr': 0x401008, 'function': 'main'},
+            {'start_addr': 0x401010, 'end_addr': 0x401020, 'function': 'main'},
+        ])
+
+    def test_load_disassembly_info(self):
+        """Test loading disassembly information from a JSON .disas file"""
+        disas_path = os.path.join(self._project_dir, 'test.disas')
+        with open(disas_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'bbs': [
+                    {'start_addr': 0x401000, 'end_addr': 0x401008, 'function': 'main'},
+                    {'start_addr': 0x401010, 'end_addr': 0x401020, 'function': None},
+                ],
+                'base_addr': 0x400000,
+                'end_addr': 0x500000,
+            }, f)
+
+        disas_info = basic_block.load_disassembly_info(disas_path)
+
+        self.assertEqual(disas_info['base_addr'], 0x400000)
+        self.assertEqual(disas_info['end_addr'], 0x500000)
+        self.assertEqual([(bb.start_addr, bb.end_addr, bb.function) for bb in disas_info['bbs']],
+                         [(0x401000, 0x401008, 'main'), (0x401010, 0x401020, '')])
+        self.assertTrue(all(isinstance(bb, BasicBlock) for bb in disas_info['bbs']))
+
+    def _get_covered_basic_blocks(self, tb_coverage, bbs):
+        bb_coverage = basic_block._get_basic_block_coverage(tb_coverage, bbs)
+
+        return {state: [bbs[i] for i in basic_block._get_covered_basic_block_idxs(bitmap, len(bbs))]
+                for state, bitmap in bb_coverage.items()}
+
+    def test_adjacent_basic_block_coverage(self):
+        """Test that basic block end addresses are exclusive"""
+        bbs = [BasicBlock(addr, addr + 0x10, 'main') for addr in range(0, 0x40, 0x10)]
+
+        covered_bbs = self._get_covered_basic_blocks({0: {(0x20, 0x2c, 0x10)}}, bbs)
+
+        self.assertEqual(covered_bbs, {0: [bbs[2]]})
+
+    def test_overlapping_basic_block_coverage(self):
+        """Test that any basic block overlapping a translation block is covered"""
+        bbs = [BasicBlock(addr, addr + 0x10, 'main') for addr in range(0, 0x40, 0x10)]
+        tb_coverage = {
+            # Basic blocks that lie entirely within the translation block
+            0: {(0x0, 0x30, 0x34)},
+            # A translation block that starts in the middle of a basic block
+            1: {(0x18, 0x1c, 0x8)},
+            # A translation block that does not overlap any basic blocks
+            2: {(0x40, 0x48, 0xc)},
+        }
+
+        covered_bbs = self._get_covered_basic_blocks(tb_coverage, bbs)
+
+        self.assertEqual(covered_bbs, {0: bbs, 1: [bbs[1]]})
+
+    def test_parallel_coverage(self):
+        """Test that coverage calculated in parallel matches the serial results"""
+        bbs = [BasicBlock(addr, addr + 8, 'main') for addr in range(0x401000, 0x402000, 0x10)]
+        tb_coverage = {
+            state: {(addr, addr + 3, 4) for addr in range(0x401000 + state * 0x10, 0x402000, 0x30)}
+            for state in range(4)
+        }
+
+        bb_arrays = np.empty((3, len(bbs)), dtype=np.uint64)
+        bb_arrays[0], bb_arrays[1] = basic_block._get_basic_block_arrays(bbs)
+        np.maximum.accumulate(bb_arrays[1], out=bb_arrays[2])
+
+        with patch.object(basic_block, 'PARALLEL_COVERAGE_MIN_WORK', 0):
+            bb_coverage = basic_block._get_basic_block_coverage(tb_coverage, bbs)
+
+        self.assertEqual(set(bb_coverage), set(tb_coverage))
+        for state, coverage in tb_coverage.items():
+            tb_starts, tb_ends = basic_block._get_tb_arrays(coverage)
+            tb_bounds = basic_block._get_tb_bounds(bb_arrays, tb_starts, tb_ends)
+            expected = basic_block._cover_state(bb_arrays, tb_starts, *tb_bounds)
+            np.testing.assert_array_equal(bb_coverage[state], expected)
+
+    def test_parallel_coverage_no_shared_memory(self):
+        """Test that coverage is calculated serially if shared memory is unavailable"""
+        tb_coverage = {
+            0: {(0x401000, 0x401004, 5)},
+            1: {(0x401032, 0x401034, 3)},
+        }
+
+        with patch.object(basic_block, 'PARALLEL_COVERAGE_MIN_WORK', 0), \
+                patch.object(basic_block.shared_memory, 'SharedMemory', side_effect=OSError):
+            covered_bbs = self._get_covered_basic_blocks(tb_coverage, self._bbs)
+
+        self.assertEqual(covered_bbs, {0: [self._bbs[0]], 1: [self._bbs[2]]})
+
+    def test_basic_block_immutable(self):
+        """Test that basic blocks cannot be modified"""
+        bb = BasicBlock(0x401000, 0x401008, 'main')
+
+        with self.assertRaises(AttributeError):
+            bb.start_addr = 0
+        with self.assertRaises(AttributeError):
+            del bb.function
+        with self.assertRaises(AttributeError):
+            bb.foo = 0
+
+        bb = pickle.loads(pickle.dumps(bb))
+        self.assertEqual((bb.start_addr, bb.end_addr, bb.function), (0x401000, 0x401008, 'main'))
+
+    def _save_and_load_disassembly_cache(self, bbs, base_addr, end_addr):
+        disas_path = os.path.join(self._project_dir, 'test.disas.bin')
+        basic_block._save_disassembly_cache(disas_path, {
+            'bbs': bbs,
+            'base_addr': base_addr,
+            'end_addr': end_addr,
+        })
+
+        return disas_path, basic_block._load_disassembly_cache(disas_path)
+
+    def test_disassembly_cache(self):
+        """Test saving and loading the disassembly cache file"""
+        bbs = self._bbs + [
+            BasicBlock(0x401040, 0x401048, 'f\u00fc\u00df_\u51fd\u6570'),
+            BasicBlock(0x401050, 0x401058),
+            BasicBlock(0xfffffffffffffff0, 0xffffffffffffffff, 'main'),
+        ]
+
+        _, disas_info = self._save_and_load_disassembly_cache(bbs, 0x400000, 0xffffffffffffffff)
+
+        self.assertEqual(disas_info['base_addr'], 0x400000)
+        self.assertEqual(disas_info['end_addr'], 0xffffffffffffffff)
+        self.assertEqual(len(disas_info['bbs']), len(bbs))
+        self.assertEqual(list(disas_info['bbs']), bbs)
+
+    def test_overwrite_disassembly_cache(self):
+        """Test that overwriting the disassembly cache does not affect existing mappings"""
+        _, disas_info = self._save_and_load_disassembly_cache(self._bbs, 0x400000, 0x500000)
+        _, new_disas_info = self._save_and_load_disassembly_cache(self._bbs[:1], 0x400000, 0x500000)
+
+        self.assertEqual(list(disas_info['bbs']), self._bbs)
+        self.assertEqual(list(new_disas_info['bbs']), self._bbs[:1])
+        self.assertEqual(sorted(os.listdir(self._project_dir)), ['s2e-last', 'test.disas.bin'])
+
+    def test_cached_disassembly_info(self):
+        """Test that a saved disassembly cache file is not considered out of date"""
+        self._cmd._save_disassembly_info('test', {
+            'bbs': self._bbs,
+            'base_addr': 0x400000,
+            'end_addr': 0x500000,
+        })
+
+        disas_info = self._cmd._get_cached_disassembly_info('test')
+
+        self.assertIsNotNone(disas_info)
+        self.assertEqual(list(disas_info['bbs']), self._bbs)
+
+    def test_convert_legacy_disassembly_info(self):
+        """Test that legacy .disas files are converted to disassembly cache files"""
+        with open(os.path.join(self._project_dir, 'test.disas'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'bbs': [bb._asdict() for bb in self._bbs],
+                'base_addr': 0x400000,
+                'end_addr': 0x500000,
+            }, f)
+
+        disas_info = self._cmd._get_cached_disassembly_info('test')
+        self.assertEqual(list(disas_info['bbs']), self._bbs)
+
+        disas_info = basic_block._load_disassembly_cache(os.path.join(self._project_dir,
+                                                                      'test.disas.bin'))
+        self.assertEqual(list(disas_info['bbs']), self._bbs)
+
+    def test_empty_disassembly_cache(self):
+        """Test saving and loading a disassembly cache file with no basic blocks"""
+        _, disas_info = self._save_and_load_disassembly_cache([], 0, 0)
+
+        self.assertEqual(disas_info['base_addr'], 0)
+        self.assertEqual(disas_info['end_addr'], 0)
+        self.assertEqual(list(disas_info['bbs']), [])
+
+    def test_invalid_disassembly_cache(self):
+        """Test that invalid disassembly cache files are rejected"""
+        disas_path, _ = self._save_and_load_disassembly_cache(self._bbs, 0x400000, 0x500000)
+
+        with open(disas_path, 'rb') as f:
+            data = f.read()
+
+        invalid_data = [
+            b'',
+            b'junk',
+            data[:-1],
+            data[:-1] + b'\xff',
+            b'X' + data[1:],
+            # Counts that overflow numpy's buffer size calculations
+            data[:16] + struct.pack('<Q', 1 << 63) + data[24:],
+            data[:40] + struct.pack('<Q', (1 << 64) - 1) + data[48:],
+        ]
+
+        for invalid in invalid_data:
+            with open(disas_path, 'wb') as f:
+                f.write(invalid)
+
+            self.assertIsNone(basic_block._load_disassembly_cache(disas_path))
@@ -20,7 +20,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import os, json, itertools
+import os, json
 from unittest import TestCase
 
 from s2e_env.commands.code_coverage import basic_block
@@ -40,7 +40,7 @@ class ELFTestCase(TestCase):
         bb_coverage = basic_block._get_basic_block_coverage(tb_coverage, bbs)
 
         total_bbs = len(bbs)
-        num_covered_bbs = len(set(itertools.chain(*iter(bb_coverage.values()))))
+        num_covered_bbs = basic_block._get_num_covered_basic_blocks(bb_coverage, total_bbs)
 
         self.assertEqual(total_bbs, 1536)
         self.assertEqual(num_covered_bbs, 5)
\ No newline at end of file